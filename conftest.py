@@ -1,15 +1,55 @@
 import os
-import sys
 import time
-import json
-import subprocess
+import traceback
 import webbrowser
 from pathlib import Path
 
-from helper_functions.report_html import generate_html_report
+from fabric_ci_test.paths import load_env_once
+from helper_functions.get_workspace_reports_datasets import (
+    MissingEnvironmentError,
+    fetch_workspace_metadata_from_env,
+)
+from helper_functions.json_utils import dumps, loads
+from helper_functions.report_html import stream_html_report
 
 BASE_DIR = Path(__file__).resolve().parent
 TEST_RESULTS_DIR = BASE_DIR / "tests" / "test-results"
+METADATA_FILE = BASE_DIR / "metadata" / "reports" / "reports_datasets.json"
+
+
+def _worker_result_files() -> list[str]:
+    """Paths of the per-worker results_*.jsonl files in TEST_RESULTS_DIR."""
+    if not TEST_RESULTS_DIR.is_dir():
+        return []
+    with os.scandir(TEST_RESULTS_DIR) as entries:
+        return [
+            entry.path
+            for entry in entries
+            if entry.name.startswith("results_") and entry.name.endswith(".jsonl")
+        ]
+
+
+def _metadata_is_fresh() -> bool:
+    """True if METADATA_FILE is younger than the TTL and for WORKSPACE_ID."""
+    try:
+        ttl = int(os.getenv("METADATA_TTL_SECONDS", "300"))
+    except ValueError:
+        print("[WARN] METADATA_TTL_SECONDS is not an integer, using 300")
+        ttl = 300
+
+    age = time.time() - METADATA_FILE.stat().st_mtime
+    if age >= ttl:
+        return False
+
+    try:
+        workspace_id = loads(METADATA_FILE.read_bytes()).get("workspaceId")
+    except Exception:
+        return False
+    if workspace_id != os.getenv("WORKSPACE_ID"):
+        return False
+
+    print(f"[INFO] Report metadata is {age:.0f}s old (TTL {ttl}s), skipping refresh")
+    return True
 
 
 def pytest_sessionstart(session):
@@ -17,23 +57,26 @@ def pytest_sessionstart(session):
     if hasattr(session.config, "workerinput"):
         return
 
-    script = BASE_DIR / "helper_functions" / "get_workspace_reports_datasets.py"
-    print(f"[INFO] Running {script.name} to refresh report metadata...")
+    load_env_once(BASE_DIR / ".env")
 
-    result = subprocess.run(
-        [sys.executable, str(script)],
-        cwd=str(BASE_DIR),
-        capture_output=True,
-        text=True,
-    )
+    # Skip the refresh while the metadata file is younger than the TTL and
+    # belongs to the configured workspace
+    if METADATA_FILE.exists() and os.getenv("FABRIC_CI_FORCE_REFRESH") != "1":
+        if _metadata_is_fresh():
+            return
 
-    if result.stdout:
-        print(result.stdout.strip())
-    if result.returncode != 0:
-        print(f"[ERROR] {script.name} failed (exit {result.returncode})")
-        if result.stderr:
-            print(result.stderr.strip())
-        raise SystemExit(f"{script.name} failed — aborting test session")
+    print("[INFO] Refreshing report metadata...")
+    try:
+        payload = fetch_workspace_metadata_from_env(METADATA_FILE)
+    except MissingEnvironmentError as e:
+        print(f"[ERROR] {e}")
+        raise SystemExit("Metadata refresh failed — aborting test session")
+    except Exception:
+        print("[ERROR] Metadata refresh failed:")
+        traceback.print_exc()
+        raise SystemExit("Metadata refresh failed — aborting test session")
+
+    print(f"[INFO] Exported {payload['reportCount']} reports to {METADATA_FILE}")
 
 
 def pytest_sessionfinish(session, exitstatus):
@@ -41,53 +84,92 @@ def pytest_sessionfinish(session, exitstatus):
     if hasattr(session.config, "workerinput"):
         return
 
-    all_results = []
-    for worker_file in TEST_RESULTS_DIR.glob("results_*.json"):
-        try:
-            all_results.extend(json.loads(worker_file.read_text(encoding="utf-8")))
-        except Exception as e:
-            print(f"[WARN] Failed reading {worker_file}: {e}")
+    environment = os.environ.get("ENVIRONMENT", "prod")
+    generated_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+
+    # JSON report, streamed one worker line at a time into a temp file that is
+    # renamed into place. Only reports with failed pages are kept in memory,
+    # since the HTML report lists just those.
+    final_json = TEST_RESULTS_DIR / "all_reports_results.json"
+    final_json.parent.mkdir(parents=True, exist_ok=True)
+
+    worker_files = _worker_result_files()
 
+    total_reports = 0
     total_pages = 0
     failed_pages = 0
-    for report in all_results:
-        pages = report.get("pages", {})
-        total_pages += len(pages)
-        failed_pages += sum(1 for p in pages.values() if p.get("errors"))
-
-    summary = {
-        "totalReports": len(all_results),
-        "totalPages": total_pages,
-        "failedPages": failed_pages,
-        "passedPages": total_pages - failed_pages,
-        "passRate": (
-            round(((total_pages - failed_pages) / total_pages) * 100, 2)
-            if total_pages
-            else 0
-        ),
-    }
+    failed_reports = []
+
+    final_tmp = final_json.with_suffix(".tmp")
+    with final_tmp.open("wb") as out:
+        out.write(
+            b"".join(
+                [
+                    b'{"environment":',
+                    dumps(environment),
+                    b',"generatedAt":',
+                    dumps(generated_at),
+                    b',"reports":[',
+                ]
+            )
+        )
+        for worker_file in worker_files:
+            with open(worker_file, "rb") as f:
+                for line_no, line in enumerate(f, 1):
+                    line = line.rstrip()
+                    if not line:
+                        continue
+                    try:
+                        report = loads(line)
+                    except Exception as e:
+                        print(f"[WARN] Failed reading {worker_file}:{line_no}: {e}")
+                        continue
+
+                    report_failed = len(report.get("failedPages", ()))
+                    total_pages += len(report.get("pages", ()))
+                    failed_pages += report_failed
+                    if report_failed:
+                        failed_reports.append(report)
+
+                    if total_reports:
+                        out.write(b",")
+                    out.write(line)
+                    total_reports += 1
+
+        summary = {
+            "totalReports": total_reports,
+            "totalPages": total_pages,
+            "failedPages": failed_pages,
+            "passedPages": total_pages - failed_pages,
+            "passRate": (
+                round(((total_pages - failed_pages) / total_pages) * 100, 2)
+                if total_pages
+                else 0
+            ),
+        }
+        out.write(b"".join([b'],"summary":', dumps(summary), b"}"]))
+    final_tmp.replace(final_json)
+    print(f"[INFO] Final aggregated JSON: {final_json}")
 
     final_output = {
-        "environment": os.environ.get("ENVIRONMENT", "prod"),
-        "generatedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "environment": environment,
+        "generatedAt": generated_at,
         "summary": summary,
-        "reports": all_results,
+        "reports": failed_reports,
     }
 
-    # JSON report
-    final_json = TEST_RESULTS_DIR / "all_reports_results.json"
-    final_json.parent.mkdir(parents=True, exist_ok=True)
-    final_json.write_text(json.dumps(final_output, indent=2), encoding="utf-8")
-    print(f"[INFO] Final aggregated JSON: {final_json}")
-
     # HTML report
     html_report = TEST_RESULTS_DIR / "report.html"
-    html_report.write_text(generate_html_report(final_output, TEST_RESULTS_DIR), encoding="utf-8")
+    html_tmp = html_report.with_suffix(".tmp")
+    with html_tmp.open("w", encoding="utf-8") as f:
+        for chunk in stream_html_report(final_output, TEST_RESULTS_DIR):
+            f.write(chunk)
+    html_tmp.replace(html_report)
     print(f"[INFO] HTML report: {html_report}")
 
     if not os.environ.get("CI"):
         webbrowser.open(html_report.as_uri())
 
-    # Clean worker JSONs
-    for f in TEST_RESULTS_DIR.glob("results_*.json"):
-        f.unlink()
+    # Clean worker JSONL files
+    for f in worker_files:
+        os.unlink(f)
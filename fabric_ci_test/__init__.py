@@ -6,22 +6,18 @@ import os
 import sys
 import subprocess
 import webbrowser
-from pathlib import Path
-from dotenv import load_dotenv
 
+from fabric_ci_test.paths import find_project_root, load_env_once
 
-def _find_project_root() -> Path:
-    """Walk up from CWD looking for conftest.py or pytest.ini as project markers."""
-    cwd = Path.cwd().resolve()
-    for parent in [cwd, *cwd.parents]:
-        if (parent / "pytest.ini").exists() or (parent / "conftest.py").exists():
-            return parent
-    return cwd
+
+def _in_jupyter() -> bool:
+    """True when running inside an IPython/Jupyter kernel."""
+    return "ipykernel" in sys.modules
 
 
 def init(env_file: str = ".env.example"):
     """Scaffold environment: copy .env template and install Playwright browsers."""
-    root = _find_project_root()
+    root = find_project_root()
     source = root / env_file
     target = root / ".env"
 
@@ -47,40 +43,15 @@ def fetch() -> dict:
     Reads credentials from environment variables / .env file.
     Returns the metadata dict and writes it to metadata/reports/reports_datasets.json.
     """
-    root = _find_project_root()
-    load_dotenv(root / ".env")
-
-    client_id = os.environ.get("SP_CLIENT_ID")
-    client_secret = os.environ.get("SP_CLIENT_SECRET")
-    tenant_id = os.environ.get("SP_TENANT_ID")
-    workspace_id = os.environ.get("WORKSPACE_ID")
-    environment = os.environ.get("ENVIRONMENT", "prod")
-
-    missing = [
-        name
-        for name, value in {
-            "SP_CLIENT_ID": client_id,
-            "SP_TENANT_ID": tenant_id,
-            "SP_CLIENT_SECRET": client_secret,
-            "WORKSPACE_ID": workspace_id,
-        }.items()
-        if not value
-    ]
-    if missing:
-        raise RuntimeError(
-            f"Missing required environment variables: {', '.join(missing)}"
-        )
-
-    from helper_functions.get_workspace_reports_datasets import fetch_workspace_metadata
-
-    output_path = root / "metadata" / "reports" / "reports_datasets.json"
-    return fetch_workspace_metadata(
-        client_id=client_id,
-        client_secret=client_secret,
-        tenant_id=tenant_id,
-        workspace_id=workspace_id,
-        environment=environment,
-        output_path=output_path,
+    root = find_project_root()
+    load_env_once(root / ".env")
+
+    from helper_functions.get_workspace_reports_datasets import (
+        fetch_workspace_metadata_from_env,
+    )
+
+    return fetch_workspace_metadata_from_env(
+        root / "metadata" / "reports" / "reports_datasets.json"
     )
 
 
@@ -95,37 +66,55 @@ def test(workers: int | str = 1, filter: str | None = None, *extra_args: str) ->
     Returns:
         pytest exit code (0 = all passed).
     """
-    root = _find_project_root()
-    load_dotenv(root / ".env")
+    root = find_project_root()
+    load_env_once(root / ".env")
 
-    cmd = [sys.executable, "-m", "pytest", "-v", "--tb=short", f"--rootdir={root}"]
+    args = ["-v", "--tb=short", f"--rootdir={root}"]
 
     if workers != 1:
-        cmd.append(f"-n={workers}")
+        args.append(f"-n={workers}")
 
     if filter:
-        cmd.append(f"-k={filter}")
+        args.append(f"-k={filter}")
 
-    cmd.extend(extra_args)
+    args.extend(extra_args)
 
-    # Run as subprocess to avoid Playwright sync API conflicting with
-    # Jupyter's asyncio event loop.
-    result = subprocess.run(cmd, cwd=str(root))
-    return result.returncode
+    if _in_jupyter():
+        # Run as subprocess to avoid Playwright sync API conflicting with
+        # Jupyter's asyncio event loop.
+        result = subprocess.run([sys.executable, "-m", "pytest", *args], cwd=str(root))
+        return result.returncode
 
+    import pytest
 
-def report(json_output: bool = False):
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        return int(pytest.main(args))
+    finally:
+        os.chdir(cwd)
+
+
+def report(json_output: bool = False, pretty: bool = False):
     """Open the test results report.
 
     Args:
         json_output: If True, print the JSON results path instead of opening HTML.
+        pretty: With json_output, write an indented copy of the results and
+            print its path instead.
     """
-    root = _find_project_root()
+    root = find_project_root()
     results_dir = root / "tests" / "test-results"
 
     if json_output:
         json_file = results_dir / "all_reports_results.json"
         if json_file.exists():
+            if pretty:
+                from helper_functions.json_utils import dumps, loads
+
+                pretty_file = json_file.with_name("all_reports_results.pretty.json")
+                pretty_file.write_bytes(dumps(loads(json_file.read_bytes()), indent=True))
+                json_file = pretty_file
             print(str(json_file))
         else:
             print(f"No results found at {json_file}")
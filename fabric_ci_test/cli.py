@@ -4,19 +4,12 @@ import os
 import sys
 import subprocess
 import webbrowser
-from pathlib import Path
 
 import click
-from dotenv import load_dotenv
+import pytest
 
-
-def _find_project_root():
-    """Find the project root by looking for pytest.ini or pyproject.toml."""
-    cwd = Path.cwd()
-    for marker in ("pytest.ini", "pyproject.toml", ".env"):
-        if (cwd / marker).exists():
-            return cwd
-    return cwd
+from fabric_ci_test.paths import find_project_root, load_env_once
+from helper_functions.json_utils import dumps, loads
 
 
 @click.group()
@@ -28,7 +21,7 @@ def cli():
 @cli.command()
 def init():
     """Scaffold .env file and install Playwright browsers."""
-    root = _find_project_root()
+    root = find_project_root()
     env_file = root / ".env"
     env_example = root / ".env.example"
 
@@ -69,8 +62,8 @@ def init():
 @cli.command()
 def fetch():
     """Refresh workspace metadata (reports & datasets from Power BI API)."""
-    root = _find_project_root()
-    load_dotenv(root / ".env")
+    root = find_project_root()
+    load_env_once(root / ".env")
 
     script = root / "helper_functions" / "get_workspace_reports_datasets.py"
     if not script.exists():
@@ -79,7 +72,7 @@ def fetch():
 
     click.echo("Fetching workspace metadata...")
     result = subprocess.run(
-        [sys.executable, str(script)],
+        [sys.executable, "-m", "helper_functions.get_workspace_reports_datasets"],
         cwd=str(root),
         check=False,
     )
@@ -96,30 +89,39 @@ def fetch():
     "--filter", "-k", "test_filter", default=None, help="Filter tests by name (pytest -k)."
 )
 @click.argument("pytest_args", nargs=-1, type=click.UNPROCESSED)
-def test(workers, test_filter, pytest_args):
+@click.pass_context
+def test(ctx, workers, test_filter, pytest_args):
     """Run visual regression tests."""
-    root = _find_project_root()
-    load_dotenv(root / ".env")
+    root = find_project_root()
+    load_env_once(root / ".env")
 
-    cmd = [sys.executable, "-m", "pytest"]
+    args = []
 
     if workers:
-        cmd.extend(["-n", str(workers)])
+        args.extend(["-n", str(workers)])
     if test_filter:
-        cmd.extend(["-k", test_filter])
+        args.extend(["-k", test_filter])
 
-    cmd.extend(pytest_args)
+    args.extend(pytest_args)
 
     click.echo("Running visual regression tests...")
-    result = subprocess.run(cmd, cwd=str(root))
-    sys.exit(result.returncode)
+    cwd = os.getcwd()
+    os.chdir(root)
+    try:
+        code = int(pytest.main(args))
+    finally:
+        os.chdir(cwd)
+    ctx.exit(code)
 
 
 @cli.command()
 @click.option("--json", "show_json", is_flag=True, help="Open JSON results instead.")
-def report(show_json):
+@click.option(
+    "--pretty", is_flag=True, help="With --json, open an indented copy of the results."
+)
+def report(show_json, pretty):
     """Open the test report in the browser."""
-    root = _find_project_root()
+    root = find_project_root()
     results_dir = root / "tests" / "test-results"
 
     target = results_dir / (
@@ -131,5 +133,10 @@ def report(show_json):
         click.echo("Run 'fabric-ci-test test' first to generate a report.")
         sys.exit(1)
 
+    if show_json and pretty:
+        pretty_target = target.with_name("all_reports_results.pretty.json")
+        pretty_target.write_bytes(dumps(loads(target.read_bytes()), indent=True))
+        target = pretty_target
+
     click.echo(f"Opening {target.name}...")
     webbrowser.open(target.as_uri())
@@ -0,0 +1,30 @@
+"""Project root discovery and .env loading shared by the library and CLI entry points."""
+
+import functools
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+
+def find_project_root() -> Path:
+    """Walk up from CWD looking for conftest.py or pytest.ini as project markers."""
+    return _project_root_for(Path.cwd().resolve())
+
+
+@functools.lru_cache(maxsize=None)
+def _project_root_for(cwd: Path) -> Path:
+    for parent in [cwd, *cwd.parents]:
+        if (parent / "pytest.ini").exists() or (parent / "conftest.py").exists():
+            return parent
+    return cwd
+
+
+_LOADED_ENV_FILES: set[Path] = set()
+
+
+def load_env_once(env_file: Path) -> None:
+    """Load env_file into os.environ, parsing each existing file at most once per process."""
+    if env_file in _LOADED_ENV_FILES or not env_file.is_file():
+        return
+    load_dotenv(env_file)
+    _LOADED_ENV_FILES.add(env_file)
@@ -1,9 +1,42 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain
 from pathlib import Path
-import json
 from typing import TypeVar, List, Any
 
+from helper_functions.json_utils import loads
+
 T = TypeVar("T", bound=Any)
 
+# A JSON object or array: optional leading whitespace, then '{' or '['
+_JSON_START = re.compile(rb"\s*[\[{]")
+
+
+def _read_reports(json_file: str) -> list:
+    """Return the "reports" list of one JSON file, or [] if it has none."""
+    try:
+        buf = Path(json_file).read_bytes()
+        if b'"reports"' not in buf:
+            return []  # no reports key; skip the parse
+        if not _JSON_START.match(buf):
+            print(f"Failed to read/parse JSON file: {json_file}")
+            print("not a JSON object or array")
+            return []
+        data = loads(buf)
+    except Exception as exc:
+        print(f"Failed to read/parse JSON file: {json_file}")
+        print(exc)
+        return []
+
+    # Ensure 'reports' key exists and is a list
+    reports = data.get("reports", []) if isinstance(data, dict) else []
+    if not isinstance(reports, list):
+        print(f"Warning: 'reports' is not a list in file {json_file}")
+        return []
+    return reports
+
+
 def read_json_files_from_folder(folder_path: str | Path) -> List[T]:
     """
     Read all JSON files from a folder and return a flat list of reports.
@@ -19,18 +52,19 @@ def read_json_files_from_folder(folder_path: str | Path) -> List[T]:
 
     all_reports: List[T] = []
 
-    for json_file in folder.glob("*.json"):
-        try:
-            with json_file.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-                # Ensure 'reports' key exists and is a list
-                reports = data.get("reports", [])
-                if isinstance(reports, list):
-                    all_reports.extend(reports)  # <-- flatten here
-                else:
-                    print(f"Warning: 'reports' is not a list in file {json_file}")
-        except Exception as exc:
-            print(f"Failed to read/parse JSON file: {json_file}")
-            print(exc)
+    with os.scandir(folder) as entries:
+        json_files = [
+            entry.path
+            for entry in entries
+            if entry.name.endswith(".json") and entry.is_file(follow_symlinks=False)
+        ]
+
+    if not json_files:
+        return all_reports
+
+    max_workers = min(32, (os.cpu_count() or 1) * 4, len(json_files))
+    with ThreadPoolExecutor(max_workers=max_workers) as ex:
+        # flatten here
+        all_reports.extend(chain.from_iterable(ex.map(_read_reports, json_files)))
 
     return all_reports
@@ -1,10 +1,71 @@
 #!/usr/bin/env python3
 import os
 import sys
-import json
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from pathlib import Path
+from types import MappingProxyType
+
+from helper_functions.json_utils import dumps, loads
+from helper_functions.log_utils import logger
+
+# Upper bound on concurrent dataset detail requests
+MAX_DATASET_WORKERS = 16
+
+# Shared keep-alive connection pool, sized for the dataset fan-out, with
+# 429/5xx backoff
+_ADAPTER = HTTPAdapter(
+    pool_connections=32,
+    pool_maxsize=32,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.2,
+        status_forcelist=[429, 500, 502, 503, 504],
+        raise_on_status=False,
+    ),
+)
+
+# Unauthenticated session for token requests
+_SESSION = requests.Session()
+_SESSION.mount("https://", _ADAPTER)
+_SESSION.headers.update({"Accept": "application/json"})
+
+# Read-only stand-in for datasets whose details could not be fetched
+_EMPTY = MappingProxyType({})
+
+
+# Opt-in on-disk cache of dataset details, revalidated with If-None-Match
+ETAG_CACHE_FILE = Path.home() / ".cache" / "fabric_ci_test" / "datasets.json"
+
+
+def _load_etag_cache() -> dict:
+    try:
+        return loads(ETAG_CACHE_FILE.read_bytes())
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_etag_cache(cache: dict) -> None:
+    ETAG_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ETAG_CACHE_FILE.with_suffix(".tmp")
+    tmp.write_bytes(dumps(cache))
+    tmp.replace(ETAG_CACHE_FILE)
+
+
+def _get_dataset(
+    session: requests.Session, url: str, cached: dict | None
+) -> tuple[dict | None, str | None]:
+    """GET one dataset; returns (data, etag), or (None, None) on a non-OK response."""
+    headers = {"If-None-Match": cached["etag"]} if cached else None
+    ds_resp = session.get(url, headers=headers, timeout=30)
+    if cached and ds_resp.status_code == 304:
+        return cached["data"], cached["etag"]
+    if not ds_resp.ok:
+        return None, None
+    return ds_resp.json(), ds_resp.headers.get("ETag")
 
 
 def fetch_workspace_metadata(
@@ -34,7 +95,7 @@ def fetch_workspace_metadata(
         pbi_api = "https://api.powerbi.com"
 
     # Token Acquisition
-    token_resp = requests.post(
+    token_resp = _SESSION.post(
         auth_url,
         data={
             "grant_type": "client_credentials",
@@ -51,14 +112,18 @@ def fetch_workspace_metadata(
         )
 
     access_token = token_resp.json()["access_token"]
-    headers = {
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-    }
+
+    # Per-call session on the shared pool, so concurrent calls with different
+    # credentials never see each other's bearer token
+    api = requests.Session()
+    api.mount("https://", _ADAPTER)
+    api.headers.update(
+        {"Accept": "application/json", "Authorization": f"Bearer {access_token}"}
+    )
 
     # Fetch Reports
     reports_url = f"{pbi_api}/v1.0/myorg/groups/{workspace_id}/reports"
-    resp = requests.get(reports_url, headers=headers, timeout=30)
+    resp = api.get(reports_url, timeout=30)
 
     if resp.status_code != 200:
         raise RuntimeError(f"Failed to fetch reports: {resp.text}")
@@ -68,56 +133,86 @@ def fetch_workspace_metadata(
     # Deterministic ordering
     reports_raw.sort(key=lambda r: r["id"])
 
-    # Fetch dataset details (including RLS roles)
+    # Fetch dataset details (including RLS roles), one request per dataset in parallel
     dataset_ids = {r.get("datasetId") for r in reports_raw if r.get("datasetId")}
     dataset_metadata = {}
 
-    for ds_id in dataset_ids:
+    use_etag_cache = os.getenv("FABRIC_CI_ETAG_CACHE") == "1"
+    etag_cache = _load_etag_cache() if use_etag_cache else {}
+
+    if dataset_ids:
+        with ThreadPoolExecutor(
+            max_workers=min(MAX_DATASET_WORKERS, len(dataset_ids))
+        ) as ex:
+            futures = {
+                ex.submit(
+                    _get_dataset,
+                    api,
+                    f"{pbi_api}/v1.0/myorg/groups/{workspace_id}/datasets/{ds_id}",
+                    etag_cache.get(ds_id),
+                ): ds_id
+                for ds_id in dataset_ids
+            }
+            for future in as_completed(futures):
+                ds_id = futures[future]
+                try:
+                    ds_data, etag = future.result()
+                    if ds_data is not None:
+                        if use_etag_cache and etag:
+                            etag_cache[ds_id] = {"etag": etag, "data": ds_data}
+                        ds_name = ds_data.get("name", "")
+                        is_effective_identity_required = ds_data.get(
+                            "isEffectiveIdentityRequired", False
+                        )
+                        is_effective_identity_roles_required = ds_data.get(
+                            "isEffectiveIdentityRolesRequired", False
+                        )
+
+                        dataset_metadata[ds_id] = {
+                            "name": ds_name,
+                            "isEffectiveIdentityRequired": is_effective_identity_required,
+                            "isEffectiveIdentityRolesRequired": is_effective_identity_roles_required,
+                        }
+                        logger.info(
+                            "Dataset %s (%s): effectiveIdentityRequired=%s, rolesRequired=%s",
+                            ds_id,
+                            ds_name,
+                            is_effective_identity_required,
+                            is_effective_identity_roles_required,
+                        )
+                except Exception as e:
+                    logger.warning("Could not fetch dataset %s: %s", ds_id, e)
+
+    if use_etag_cache:
         try:
-            ds_url = f"{pbi_api}/v1.0/myorg/groups/{workspace_id}/datasets/{ds_id}"
-            ds_resp = requests.get(ds_url, headers=headers, timeout=30)
-            if ds_resp.ok:
-                ds_data = ds_resp.json()
-                ds_name = ds_data.get("name", "")
-                is_effective_identity_required = ds_data.get(
-                    "isEffectiveIdentityRequired", False
-                )
-                is_effective_identity_roles_required = ds_data.get(
-                    "isEffectiveIdentityRolesRequired", False
-                )
-
-                dataset_metadata[ds_id] = {
-                    "name": ds_name,
-                    "isEffectiveIdentityRequired": is_effective_identity_required,
-                    "isEffectiveIdentityRolesRequired": is_effective_identity_roles_required,
-                }
-                print(
-                    f"  Dataset {ds_id} ({ds_name}): effectiveIdentityRequired={is_effective_identity_required}, rolesRequired={is_effective_identity_roles_required}"
-                )
-        except Exception as e:
-            print(f"  WARN: Could not fetch dataset {ds_id}: {e}", file=sys.stderr)
+            _save_etag_cache(etag_cache)
+        except OSError as e:
+            logger.warning("Could not write dataset ETag cache: %s", e)
 
     # Build payload
     report_list = []
+    append_entry = report_list.append
+    dataset_metadata_get = dataset_metadata.get
     for r in reports_raw:
         ds_id = r.get("datasetId")
-        ds_info = dataset_metadata.get(ds_id, {})
-        report_entry = {
-            "Id": r["id"],
-            "Name": r["name"],
-            "WebUrl": r.get("webUrl"),
-            "EmbedUrl": r.get("embedUrl"),
-            "DatasetId": ds_id,
-            "DatasetName": ds_info.get("name", ""),
-            "WorkspaceId": workspace_id,
-            "IsEffectiveIdentityRequired": ds_info.get(
-                "isEffectiveIdentityRequired", False
-            ),
-            "IsEffectiveIdentityRolesRequired": ds_info.get(
-                "isEffectiveIdentityRolesRequired", False
-            ),
-        }
-        report_list.append(report_entry)
+        ds_info = dataset_metadata_get(ds_id) or _EMPTY
+        append_entry(
+            {
+                "Id": r["id"],
+                "Name": r["name"],
+                "WebUrl": r.get("webUrl"),
+                "EmbedUrl": r.get("embedUrl"),
+                "DatasetId": ds_id,
+                "DatasetName": ds_info.get("name", ""),
+                "WorkspaceId": workspace_id,
+                "IsEffectiveIdentityRequired": ds_info.get(
+                    "isEffectiveIdentityRequired", False
+                ),
+                "IsEffectiveIdentityRolesRequired": ds_info.get(
+                    "isEffectiveIdentityRolesRequired", False
+                ),
+            }
+        )
 
     payload = {
         "workspaceId": workspace_id,
@@ -132,58 +227,63 @@ def fetch_workspace_metadata(
         out = Path(output_path).resolve()
         out.parent.mkdir(parents=True, exist_ok=True)
         tmp = out.with_suffix(".tmp")
-        with tmp.open("w", encoding="utf-8") as f:
-            json.dump(payload, f, indent=2)
+        tmp.write_bytes(dumps(payload))
         tmp.replace(out)
-        print(f"SUCCESS: Exported {payload['reportCount']} reports to {out}")
+        logger.info("Exported %d reports to %s", payload["reportCount"], out)
 
     return payload
 
 
+# Credentials fetch_workspace_metadata_from_env reads from the environment
+REQUIRED_ENV_VARS = ("SP_CLIENT_ID", "SP_TENANT_ID", "SP_CLIENT_SECRET", "WORKSPACE_ID")
+
+
+class MissingEnvironmentError(RuntimeError):
+    """Raised when required credential variables are not set."""
+
+
+def fetch_workspace_metadata_from_env(output_path: Path | str | None = None) -> dict:
+    """
+    Run fetch_workspace_metadata with credentials from environment variables
+    (REQUIRED_ENV_VARS, plus ENVIRONMENT defaulting to "prod").
+
+    Raises MissingEnvironmentError naming every required variable that is unset.
+    """
+    missing = [name for name in REQUIRED_ENV_VARS if not os.getenv(name)]
+    if missing:
+        raise MissingEnvironmentError(
+            f"Missing required environment variables: {', '.join(missing)}"
+        )
+
+    return fetch_workspace_metadata(
+        client_id=os.environ["SP_CLIENT_ID"],
+        client_secret=os.environ["SP_CLIENT_SECRET"],
+        tenant_id=os.environ["SP_TENANT_ID"],
+        workspace_id=os.environ["WORKSPACE_ID"],
+        environment=os.getenv("ENVIRONMENT", "prod"),
+        output_path=output_path,
+    )
+
+
 # ------------------------------------
 # Standalone script entry point
 # ------------------------------------
 if __name__ == "__main__":
+    import logging
+
     from dotenv import load_dotenv
 
     load_dotenv(".env")
-
-    app_id = os.getenv("SP_CLIENT_ID")
-    tenant_id = os.getenv("SP_TENANT_ID")
-    client_secret = os.getenv("SP_CLIENT_SECRET")
-    workspace_id = os.getenv("WORKSPACE_ID")
-    environment = os.getenv("ENVIRONMENT", "prod")
-
-    missing = [
-        name
-        for name, value in {
-            "SP_CLIENT_ID": app_id,
-            "SP_TENANT_ID": tenant_id,
-            "SP_CLIENT_SECRET": client_secret,
-            "WORKSPACE_ID": workspace_id,
-        }.items()
-        if not value
-    ]
-
-    if missing:
-        print(
-            f"ERROR: Missing required environment variables: {', '.join(missing)}",
-            file=sys.stderr,
-        )
-        sys.exit(2)
+    logger.setLevel(logging.INFO)
 
     base_dir = Path(__file__).resolve().parent.parent
     output_file = base_dir / "metadata" / "reports" / "reports_datasets.json"
 
     try:
-        fetch_workspace_metadata(
-            client_id=app_id,
-            client_secret=client_secret,
-            tenant_id=tenant_id,
-            workspace_id=workspace_id,
-            environment=environment,
-            output_path=output_file,
-        )
+        fetch_workspace_metadata_from_env(output_file)
+    except MissingEnvironmentError as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
     except RuntimeError as e:
         print(f"ERROR: {e}", file=sys.stderr)
         sys.exit(3)
@@ -1,14 +1,44 @@
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+# -----------------------------
+# HTTP session
+
+
+# (connect, read) timeout for Azure AD and Power BI calls
+REQUEST_TIMEOUT = (5, 30)
+
+# Shared keep-alive session for the token and GenerateToken POSTs. Both calls
+# are safe to repeat, so POST is retried on 429/5xx as well.
+_SESSION = requests.Session()
+_SESSION.mount(
+    "https://",
+    HTTPAdapter(
+        pool_connections=16,
+        pool_maxsize=16,
+        max_retries=Retry(
+            total=3,
+            backoff_factor=0.3,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset({"GET", "POST"}),
+            raise_on_status=False,
+        ),
+    ),
+)
 
 
 # -----------------------------
 # Types
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TestSettings:
     __test__ = False
     client_id: str
@@ -17,7 +47,7 @@ class TestSettings:
     environment: str  # 'prod' | 'gov' | etc.
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class ReportEmbedInfo:
     report_id: str
     workspace_id: str
@@ -29,7 +59,7 @@ class ReportEmbedInfo:
     is_effective_identity_roles_required: bool = False
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class APIEndpoints:
     api_prefix: str
     web_prefix: str
@@ -39,7 +69,19 @@ class APIEndpoints:
 # Get Access Token (Service Principal)
 
 
+# (tenant_id, client_id, environment) -> (access_token, refresh_at monotonic seconds)
+_TOKEN_CACHE: Dict[Tuple[str, str, str], Tuple[str, float]] = {}
+
+# Refresh cached tokens this many seconds before they expire
+_TOKEN_EXPIRY_MARGIN = 60
+
+
 def get_access_token(settings: TestSettings) -> str:
+    cache_key = (settings.tenant_id, settings.client_id, settings.environment)
+    cached = _TOKEN_CACHE.get(cache_key)
+    if cached and time.monotonic() < cached[1]:
+        return cached[0]
+
     url = f"https://login.microsoftonline.com/{settings.tenant_id}/oauth2/v2.0/token"
 
     data = {
@@ -49,7 +91,7 @@ def get_access_token(settings: TestSettings) -> str:
         "scope": "https://analysis.windows.net/powerbi/api/.default",
     }
 
-    response = requests.post(url, data=data)
+    response = _SESSION.post(url, data=data, timeout=REQUEST_TIMEOUT)
     response.raise_for_status()
 
     json_data = response.json()
@@ -58,9 +100,20 @@ def get_access_token(settings: TestSettings) -> str:
     if not access_token:
         raise RuntimeError(f"Failed to get access token: {json_data}")
 
+    expires_in = int(json_data.get("expires_in", 3600))
+    _TOKEN_CACHE[cache_key] = (
+        access_token,
+        time.monotonic() + expires_in - _TOKEN_EXPIRY_MARGIN,
+    )
+
     return access_token
 
 
+def clear_token_cache() -> None:
+    """Forget all cached access tokens, e.g. after rotating a client secret."""
+    _TOKEN_CACHE.clear()
+
+
 # -----------------------------
 # Get Embed Token for a Report
 
@@ -98,7 +151,9 @@ def get_report_embed_token(
         "Authorization": f"Bearer {access_token}",
     }
 
-    response = requests.post(url, json=body, headers=headers)
+    response = _SESSION.post(
+        url, json=body, headers=headers, timeout=REQUEST_TIMEOUT
+    )
     if not response.ok:
         raise RuntimeError(
             f"GenerateToken failed ({response.status_code}) for report "
@@ -117,28 +172,62 @@ def get_report_embed_token(
     return token
 
 
+def get_report_embed_tokens(
+    report_infos: List[ReportEmbedInfo],
+    endpoints: APIEndpoints,
+    access_token: str,
+    workers: int = 16,
+) -> Dict[str, str]:
+    """Generate embed tokens for many reports concurrently, keyed by report id.
+
+    Reports whose GenerateToken call fails are left out; calling
+    get_report_embed_token for them surfaces the error.
+    """
+
+    def _try_token(report_info: ReportEmbedInfo) -> Optional[str]:
+        try:
+            return get_report_embed_token(report_info, endpoints, access_token)
+        except Exception:
+            return None
+
+    if not report_infos:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(report_infos))) as ex:
+        tokens = ex.map(_try_token, report_infos)
+        return {
+            info.report_id: token
+            for info, token in zip(report_infos, tokens)
+            if token
+        }
+
+
 # -----------------------------
 # Create Report Embed Info
 
 
 def create_report_embed_info(report: Dict[str, Any]) -> ReportEmbedInfo:
-    if not report.get("WorkspaceId"):
-        raise ValueError(f"Report {report.get('Name')} is missing WorkspaceId")
+    get = report.get
+    report_id = get("Id")
+    workspace_id = get("WorkspaceId")
+
+    if not workspace_id:
+        raise ValueError(f"Report {get('Name')} is missing WorkspaceId")
 
-    if not report.get("Id"):
-        raise ValueError(f"Report {report.get('Name')} is missing reportId")
+    if not report_id:
+        raise ValueError(f"Report {get('Name')} is missing reportId")
 
-    pages = report.get("Pages") or []
+    pages = get("Pages")
 
     return ReportEmbedInfo(
-        report_id=report["Id"],
-        workspace_id=report["WorkspaceId"],
-        dataset_id=report.get("DatasetId"),
+        report_id=report_id,
+        workspace_id=workspace_id,
+        dataset_id=get("DatasetId"),
         page_id=pages[0] if pages else None,
-        role=report.get("Role"),
-        bookmark_id=report.get("BookmarkId"),
-        is_effective_identity_required=report.get("IsEffectiveIdentityRequired", False),
-        is_effective_identity_roles_required=report.get(
+        role=get("Role"),
+        bookmark_id=get("BookmarkId"),
+        is_effective_identity_required=get("IsEffectiveIdentityRequired", False),
+        is_effective_identity_roles_required=get(
             "IsEffectiveIdentityRolesRequired", False
         ),
     )
@@ -148,18 +237,19 @@ def create_report_embed_info(report: Dict[str, Any]) -> ReportEmbedInfo:
 # API Endpoints helper
 
 
-def get_api_endpoints(environment: str) -> APIEndpoints:
-    env = environment.lower()
+_ENDPOINTS: Dict[str, APIEndpoints] = {
+    "prod": APIEndpoints(
+        api_prefix="https://api.powerbi.com", web_prefix="https://app.powerbi.com"
+    ),
+    "gov": APIEndpoints(
+        api_prefix="https://api.powerbigov.us",
+        web_prefix="https://app.powerbigov.us",
+    ),
+}
 
-    if env == "prod":
-        return APIEndpoints(
-            api_prefix="https://api.powerbi.com", web_prefix="https://app.powerbi.com"
-        )
 
-    if env == "gov":
-        return APIEndpoints(
-            api_prefix="https://api.powerbigov.us",
-            web_prefix="https://app.powerbigov.us",
-        )
-
-    raise ValueError(f"Unknown environment: {environment}")
+def get_api_endpoints(environment: str) -> APIEndpoints:
+    try:
+        return _ENDPOINTS[environment.lower()]
+    except KeyError:
+        raise ValueError(f"Unknown environment: {environment}") from None
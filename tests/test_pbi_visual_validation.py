@@ -1,9 +1,8 @@
 import os
-import json
 import time
 from pathlib import Path
 import pytest
-from playwright.sync_api import Page
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,11 +10,13 @@ load_dotenv()
 from helper_functions.token_helpers import (
     get_access_token,
     get_report_embed_token,
+    get_report_embed_tokens,
     create_report_embed_info,
     get_api_endpoints,
     TestSettings,
 )
 from helper_functions.file_reader import read_json_files_from_folder
+from helper_functions.json_utils import dumps_line
 from helper_functions.log_utils import log_to_console
 
 # -------------------- ENV --------------------
@@ -33,6 +34,10 @@ TEST_RESULTS_DIR = BASE_DIR / "tests" / "test-results"
 TEST_RESULTS_DIR.mkdir(
     parents=True, exist_ok=True
 )  # Playwright ensures clean, but just in case
+WORKER_ID = os.environ.get("PYTEST_XDIST_WORKER", "master")
+
+# Prefetched embed tokens are used for at most this long (they live ~60 min)
+EMBED_TOKEN_MAX_AGE = 45 * 60
 
 REPORTS_PATH = BASE_DIR / "metadata" / "reports"
 reports = read_json_files_from_folder(REPORTS_PATH)
@@ -43,18 +48,177 @@ if not reports:
 endpoints = get_api_endpoints(ENVIRONMENT)
 
 
+# -------------------- BROWSER SCRIPTS --------------------
+# Scans every page of the embedded report, collecting visual errors per page.
+_SCAN_JS = """
+async (reportInfo) => {
+    const t0 = performance.now();
+    const pbi = window['powerbi-client'];
+    const models = pbi.models;
+
+    const container = document.createElement('div');
+    container.id = 'powerbi-container';
+    container.style.width = '1200px';
+    container.style.height = '800px';
+    document.body.appendChild(container);
+
+    const powerbi = new pbi.service.Service(
+        pbi.factories.hpmFactory,
+        pbi.factories.wpmpFactory,
+        pbi.factories.routerFactory
+    );
+
+    const report = powerbi.embed(container, {
+        type: 'report',
+        id: reportInfo.reportId,
+        embedUrl: reportInfo.embedUrl,
+        accessToken: reportInfo.embedToken,
+        tokenType: models.TokenType.Embed,
+        permissions: models.Permissions.Read,
+        viewMode: models.ViewMode.View,
+        settings: { visualRenderedEvents: true }
+    });
+
+    const reportLoadTime = await new Promise(res =>
+        report.on('loaded', () => res(performance.now()))
+    );
+
+    const pages = await report.getPages();
+    window._pbiPages = Object.fromEntries(pages.map(p => [p.name, p]));
+    const allPages = {};
+    const failedPages = [];
+    const visualCounts = {};
+
+    for (const pageObj of pages) {
+        const pageStart = performance.now();
+        const pageName = pageObj.name;
+
+        let errorDetected = false;
+        const visuals = await pageObj.getVisuals();
+        visualCounts[pageName] = visuals.length;
+        let renderedVisuals = 0;
+        const pageErrors = {};
+
+        const onError = (event) => {
+            const visualId = event?.detail?.visualName || event?.detail?.visualId || 'unknown';
+            pageErrors[visualId] = event?.detail?.message || 'Unknown Power BI error';
+            errorDetected = true;
+        };
+        const onRendered = () => renderedVisuals++;
+
+        report.on('error', onError);
+        report.on('visualRendered', onRendered);
+
+        window._pbiActivePage = pageName;
+        await pageObj.setActive();
+
+        await Promise.race([
+            new Promise(resolve => {
+                const check = () => {
+                    if (errorDetected || renderedVisuals >= visuals.length) resolve();
+                    else setTimeout(check, 1000);
+                };
+                check();
+            }),
+            new Promise(resolve => setTimeout(resolve, 15000))
+        ]);
+
+        report.off('error', onError);
+        report.off('visualRendered', onRendered);
+
+        const pageEnd = performance.now();
+        const duration = pageEnd - pageStart;
+
+        allPages[pageName] = {
+            errors: pageErrors,
+            duration,
+            embedUrl: `https://app.powerbi.com/reportEmbed?reportId=${reportInfo.reportId}&pageName=${pageName}`,
+            serviceUrl: `https://app.powerbi.com/groups/${reportInfo.workspaceId}/reports/${reportInfo.reportId}/${pageName}`
+        };
+
+        if (Object.keys(pageErrors).length > 0) {
+            failedPages.push(pageName);
+        }
+    }
+
+    // Marks the active page as done once each of its visuals has either
+    // rendered or errored (errored visuals never fire visualRendered), so
+    // screenshots can wait on it instead of sleeping.
+    const onSettled = () => {
+        const active = window._pbiActivePage;
+        if (++window._pbiSettledCount >= (visualCounts[active] || 0)) {
+            window._pbiLastRendered = active;
+        }
+    };
+    report.on('visualRendered', onSettled);
+    report.on('error', onSettled);
+
+    return {
+        allPages,
+        failedPages,
+        reportLoadTime,
+        totalDuration: performance.now() - t0
+    };
+}
+"""
+
+# Activates a scanned page; relies on window._pbiPages set by _SCAN_JS.
+# Returns false when the page is already active (no render events will fire).
+_SET_ACTIVE_JS = """
+async (pageName) => {
+    const target = window._pbiPages[pageName];
+    if (!target || window._pbiActivePage === pageName) return false;
+    window._pbiActivePage = pageName;
+    window._pbiSettledCount = 0;
+    window._pbiLastRendered = null;
+    await target.setActive();
+    return true;
+}
+"""
+
+
 # -------------------- FIXTURES --------------------
 @pytest.fixture(scope="session")
-def access_token() -> str:
-    settings = TestSettings(
+def settings() -> TestSettings:
+    return TestSettings(
         client_id=CLIENT_ID,
         client_secret=CLIENT_SECRET,
         tenant_id=TENANT_ID,
         environment=ENVIRONMENT,
     )
+
+
+@pytest.fixture(scope="session")
+def access_token(settings: TestSettings) -> str:
     return get_access_token(settings)
 
 
+@pytest.fixture(scope="session")
+def embed_tokens(request: pytest.FixtureRequest, access_token: str) -> dict:
+    """Embed tokens for the selected reports, generated concurrently up front.
+
+    Maps report id -> (token, issued_at monotonic seconds). Empty under xdist:
+    every worker collects all reports but runs only a share of them, so each
+    test generates its own token there instead.
+    """
+    if WORKER_ID != "master":
+        return {}
+
+    infos = []
+    for item in request.session.items:
+        callspec = getattr(item, "callspec", None)
+        if callspec is None or "report" not in callspec.params:
+            continue
+        try:
+            infos.append(create_report_embed_info(callspec.params["report"]))
+        except ValueError:
+            continue  # the report's own test reports the metadata error
+
+    issued_at = time.monotonic()
+    tokens = get_report_embed_tokens(infos, endpoints, access_token)
+    return {report_id: (token, issued_at) for report_id, token in tokens.items()}
+
+
 @pytest.fixture(scope="session")
 def browser_context_args():
     return {"viewport": {"width": 1280, "height": 800}}
@@ -62,7 +226,9 @@ def browser_context_args():
 
 # -------------------- TESTS --------------------
 @pytest.mark.parametrize("report", reports, ids=lambda r: f"{r['Name']} ({r['Id']})")
-def test_pbi_rendering_validation(page: Page, access_token: str, report: dict):
+def test_pbi_rendering_validation(
+    page: Page, access_token: str, embed_tokens: dict, report: dict
+):
     start_time = time.time()
 
     page.goto("about:blank")
@@ -71,7 +237,11 @@ def test_pbi_rendering_validation(page: Page, access_token: str, report: dict):
     )
 
     embed_info = create_report_embed_info(report)
-    embed_token = get_report_embed_token(embed_info, endpoints, access_token)
+    prefetched = embed_tokens.pop(embed_info.report_id, None)
+    if prefetched and time.monotonic() - prefetched[1] < EMBED_TOKEN_MAX_AGE:
+        embed_token = prefetched[0]
+    else:
+        embed_token = get_report_embed_token(embed_info, endpoints, access_token)
 
     report_info = {
         "reportId": embed_info.report_id,
@@ -81,141 +251,32 @@ def test_pbi_rendering_validation(page: Page, access_token: str, report: dict):
     }
 
     # -------------------- SCAN PAGES --------------------
-    scan_results = page.evaluate(
-        """
-        async (reportInfo) => {
-            const t0 = performance.now();
-            const pbi = window['powerbi-client'];
-            const models = pbi.models;
-
-            const container = document.createElement('div');
-            container.id = 'powerbi-container';
-            container.style.width = '1200px';
-            container.style.height = '800px';
-            document.body.appendChild(container);
-
-            const powerbi = new pbi.service.Service(
-                pbi.factories.hpmFactory,
-                pbi.factories.wpmpFactory,
-                pbi.factories.routerFactory
-            );
-
-            const report = powerbi.embed(container, {
-                type: 'report',
-                id: reportInfo.reportId,
-                embedUrl: reportInfo.embedUrl,
-                accessToken: reportInfo.embedToken,
-                tokenType: models.TokenType.Embed,
-                permissions: models.Permissions.Read,
-                viewMode: models.ViewMode.View,
-                settings: { visualRenderedEvents: true }
-            });
-
-            const reportLoadTime = await new Promise(res =>
-                report.on('loaded', () => res(performance.now()))
-            );
-
-            const pages = await report.getPages();
-            const allPages = {};
-            const failedPages = [];
-
-            for (const pageObj of pages) {
-                const pageStart = performance.now();
-                const pageName = pageObj.name;
-
-                let errorDetected = false;
-                const visuals = await pageObj.getVisuals();
-                let renderedVisuals = 0;
-                const pageErrors = {};
-
-                const onError = (event) => {
-                    const visualId = event?.detail?.visualName || event?.detail?.visualId || 'unknown';
-                    pageErrors[visualId] = event?.detail?.message || 'Unknown Power BI error';
-                    errorDetected = true;
-                };
-                const onRendered = () => renderedVisuals++;
-
-                report.on('error', onError);
-                report.on('visualRendered', onRendered);
-
-                await pageObj.setActive();
-
-                await Promise.race([
-                    new Promise(resolve => {
-                        const check = () => {
-                            if (errorDetected || renderedVisuals >= visuals.length) resolve();
-                            else setTimeout(check, 1000);
-                        };
-                        check();
-                    }),
-                    new Promise(resolve => setTimeout(resolve, 15000))
-                ]);
-
-                report.off('error', onError);
-                report.off('visualRendered', onRendered);
-
-                const pageEnd = performance.now();
-                const duration = pageEnd - pageStart;
-
-                allPages[pageName] = {
-                    errors: pageErrors,
-                    duration,
-                    embedUrl: `https://app.powerbi.com/reportEmbed?reportId=${reportInfo.reportId}&pageName=${pageName}`,
-                    serviceUrl: `https://app.powerbi.com/groups/${reportInfo.workspaceId}/reports/${reportInfo.reportId}/${pageName}`
-                };
-
-                if (Object.keys(pageErrors).length > 0) {
-                    failedPages.push(pageName);
-                }
-            }
-
-            return {
-                allPages,
-                failedPages,
-                reportLoadTime,
-                totalDuration: performance.now() - t0
-            };
-        }
-        """,
-        report_info,
-    )
+    scan_results = page.evaluate(_SCAN_JS, report_info)
 
     # -------------------- SCREENSHOTS (only failing pages) --------------------
-    worker_id = os.environ.get("PYTEST_XDIST_WORKER", "master")
-
+    screenshot_paths = []
     for page_name in scan_results["failedPages"]:
-        page.evaluate(
-            """
-            async (pageName) => {
-                const report = window.powerbi.get(document.querySelector('#powerbi-container'));
-                const pages = await report.getPages();
-                const target = pages.find(p => p.name === pageName);
-                if (target) await target.setActive();
-            }
-            """,
-            page_name,
-        )
-        page.wait_for_timeout(800)  # allow visuals to finish rendering
-        screenshot_path = TEST_RESULTS_DIR / f"{page_name}_{worker_id}.png"
+        if page.evaluate(_SET_ACTIVE_JS, page_name):
+            try:
+                page.wait_for_function(
+                    "n => window._pbiLastRendered === n", arg=page_name, timeout=1500
+                )
+            except PlaywrightTimeoutError:
+                pass  # screenshot whatever has rendered so far
+        screenshot_path = TEST_RESULTS_DIR / f"{page_name}_{WORKER_ID}.png"
         page.locator("#powerbi-container").screenshot(path=str(screenshot_path))
-        log_to_console(f"[INFO] Screenshot saved: {screenshot_path}", False)
+        screenshot_paths.append(str(screenshot_path))
+
+    if screenshot_paths:
+        log_to_console(
+            f"[INFO] Screenshots saved: {', '.join(screenshot_paths)}", False
+        )
 
     # -------------------- SAVE RESULTS (all pages) --------------------
     end_time = time.time()
 
-    # Ensure directory exists (important for xdist)
-    TEST_RESULTS_DIR.mkdir(parents=True, exist_ok=True)
-
-    worker_id = os.environ.get("PYTEST_XDIST_WORKER", "master")
-    worker_file = TEST_RESULTS_DIR / f"results_{worker_id}.json"
-
-    existing_results = (
-        json.loads(worker_file.read_text(encoding="utf-8"))
-        if worker_file.exists()
-        else []
-    )
+    worker_file = TEST_RESULTS_DIR / f"results_{WORKER_ID}.jsonl"
 
-    # Build result FIRST
     result_data = {
         "reportId": report["Id"],
         "reportName": report["Name"],
@@ -227,11 +288,9 @@ def test_pbi_rendering_validation(page: Page, access_token: str, report: dict):
         "pythonDuration": end_time - start_time,
     }
 
-    # Append ONCE
-    existing_results.append(result_data)
-
-    # Write ONCE
-    worker_file.write_text(json.dumps(existing_results, indent=2), encoding="utf-8")
+    # One JSON line per report, appended
+    with worker_file.open("ab") as f:
+        f.write(dumps_line(result_data))
 
     log_to_console(
         f"[INFO] Appended results for report {report['Name']} -> {worker_file}",
@@ -288,31 +347,16 @@ def test_report_ids_unique():
     assert len(ids) == len(set(ids))
 
 
-def test_access_token_success():
-    settings = TestSettings(
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        tenant_id=TENANT_ID,
-        environment=ENVIRONMENT,
-    )
-
+def test_access_token_success(settings: TestSettings):
     token = get_access_token(settings)
     assert isinstance(token, str)
     assert len(token) > 20
 
 
-def test_embed_token_success():
+def test_embed_token_success(access_token: str):
     report = reports[0]
     embed_info = create_report_embed_info(report)
 
-    settings = TestSettings(
-        client_id=CLIENT_ID,
-        client_secret=CLIENT_SECRET,
-        tenant_id=TENANT_ID,
-        environment=ENVIRONMENT,
-    )
-
-    access_token = get_access_token(settings)
     token = get_report_embed_token(embed_info, endpoints, access_token)
 
     assert isinstance(token, str)
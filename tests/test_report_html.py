@@ -0,0 +1,53 @@
+import base64
+import os
+
+from helper_functions.report_html import generate_html_report, stream_html_report
+
+# Upper bound on any single chunk yielded by stream_html_report
+MAX_CHUNK_CHARS = 64 * 1024
+
+
+def _failed_output(page_name: str) -> dict:
+    return {
+        "environment": "prod",
+        "generatedAt": "2024-01-01T00:00:00Z",
+        "summary": {"totalReports": 1, "totalPages": 1, "failedPages": 1},
+        "reports": [
+            {
+                "reportId": "r1",
+                "reportName": "Report 1",
+                "pages": {
+                    page_name: {
+                        "errors": {"visual1": "<b>boom</b>"},
+                        "duration": 12.5,
+                        "serviceUrl": "https://app.powerbi.com/x",
+                    }
+                },
+            }
+        ],
+    }
+
+
+def test_screenshot_streamed_in_bounded_chunks(tmp_path):
+    png = os.urandom(4 * 1024 * 1024 + 1)
+    (tmp_path / "Page1_gw0.png").write_bytes(png)
+
+    chunks = list(stream_html_report(_failed_output("Page1"), tmp_path))
+
+    assert max(len(chunk) for chunk in chunks) <= MAX_CHUNK_CHARS
+    assert base64.b64encode(png).decode("ascii") in "".join(chunks)
+
+
+def test_error_messages_escaped(tmp_path):
+    html = generate_html_report(_failed_output("Page1"), tmp_path)
+
+    assert "&lt;b&gt;boom&lt;/b&gt;" in html
+    assert "<b>boom</b>" not in html
+
+
+def test_all_pass_report(tmp_path):
+    output = {"summary": {"passRate": 100}, "reports": []}
+
+    html = generate_html_report(output, tmp_path)
+
+    assert "All pages passed visual validation" in html